@@ -3,13 +3,28 @@ import pdfplumber
 import pymysql
 import os
 import re
+import sys
+import uuid
 import pandas as pd
+from array import array
 from datetime import datetime, date, time, timedelta
 from dotenv import load_dotenv
 import docx2txt
+import gzip
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from time import monotonic, sleep
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 db_config = {
     "host": os.getenv("MYSQL_HOST", "localhost"),
     "user": os.getenv("MYSQL_USER", "root"),
@@ -17,6 +32,50 @@ db_config = {
     "database": os.getenv("MYSQL_DATABASE", "document_db")
 }
 
+# Read replicas for dashboard listing and search, e.g. "replica1,replica2:3307"
+replica_db_configs = []
+for replica in os.getenv("MYSQL_REPLICA_HOSTS", "").split(","):
+    replica = replica.strip()
+    if replica:
+        host, _, port = replica.partition(":")
+        replica_config = {**db_config, "host": host}
+        if port:
+            replica_config["port"] = int(port)
+        replica_db_configs.append(replica_config)
+
+READ_QUERY_TIMEOUT = float(os.getenv("READ_QUERY_TIMEOUT", "15"))
+READ_POLL_INTERVAL = 0.25
+# Socket timeout for read workers: past READ_QUERY_TIMEOUT so KILL QUERY normally wins,
+# but bounded so a hung replica or a failed kill cannot hold a pool thread forever
+READ_SOCKET_TIMEOUT = READ_QUERY_TIMEOUT + 5
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "60"))
+READ_EXECUTOR_WORKERS = int(os.getenv("READ_EXECUTOR_WORKERS", "4"))
+
+# Monthly RANGE partitions on upload_time, created this many months ahead
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+# Extracted bodies older than this many days move to compressed storage (0 disables archival)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Time cap per archival pass; a pass that hits it is resumed on the next run
+ARCHIVE_PASS_SECONDS = float(os.getenv("ARCHIVE_PASS_SECONDS", "10"))
+# Pause between archival passes while a backlog remains
+ARCHIVE_PASS_PAUSE = float(os.getenv("ARCHIVE_PASS_PAUSE", "1"))
+# Archived candidates decompressed per content search
+ARCHIVE_SEARCH_LIMIT = int(os.getenv("ARCHIVE_SEARCH_LIMIT", "500"))
+ARCHIVE_CODEC = "zstd" if zstandard else "gzip"
+STORAGE_MAINTENANCE_INTERVAL = int(os.getenv("STORAGE_MAINTENANCE_INTERVAL", "3600"))
+STORAGE_MAINTENANCE_RETRY = int(os.getenv("STORAGE_MAINTENANCE_RETRY", "60"))
+ARCHIVED_COLUMNS = {
+    "documents": ("extracted_text", "extracted_tables"),
+    "file_content": ("extracted_text",),
+}
+
+# Per-session memory budget; session keys with these prefixes are dropped, largest first, once it is exceeded.
+# Extracted-text widgets and search handles are rebuilt from the database when next shown.
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "32"))
+SESSION_REGISTRY_TTL = int(os.getenv("SESSION_REGISTRY_TTL", "3600"))
+EVICTABLE_SESSION_PREFIXES = ("admin_text_", "admin_tables_", "search_results")
+
 UPLOAD_DIR = "uploads"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
@@ -29,19 +88,191 @@ def get_db_connection():
         st.error(f"Failed to connect to MySQL: {e}")
         return None
 
+@st.cache_resource
+def get_read_executor():
+    # Shared across sessions and reruns so reads never block the script thread
+    return ThreadPoolExecutor(max_workers=READ_EXECUTOR_WORKERS, thread_name_prefix="db-read")
+
+def get_read_db_configs():
+    # Read-your-writes: the admin's own recent uploads may not have reached the replicas yet
+    last_write_time = st.session_state.get("last_write_time")
+    if last_write_time and datetime.now() - last_write_time < timedelta(seconds=READ_YOUR_WRITES_SECONDS):
+        return [db_config]
+    # Replicas first, primary as the fallback
+    return replica_db_configs + [db_config]
+
+def execute_read_query(configs, query, params, active):
+    # Runs on the read executor, so it must not touch st.* calls
+    active["started"] = monotonic()
+    last_error = None
+    for config in configs:
+        if active.get("cancelled"):
+            return []
+        try:
+            conn = pymysql.connect(**config, connect_timeout=5, read_timeout=READ_SOCKET_TIMEOUT)
+        except pymysql.Error as e:
+            last_error = e
+            continue
+        active["config"] = config
+        active["conn"] = conn
+        try:
+            # Re-check after publishing conn: a cancel that saw no connection must not let this run
+            if active.get("cancelled"):
+                return []
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        except pymysql.OperationalError as e:
+            # A replica that drops mid-query falls through to the next host, unless we killed it
+            if active.get("cancelled"):
+                raise
+            last_error = e
+        finally:
+            conn.close()
+    raise last_error
+
+def cancel_read_query(future, active):
+    active["cancelled"] = True
+    if future.cancel():
+        return
+    conn = active.get("conn")
+    if conn is None or not conn.open:
+        return
+    # Stop the running statement server-side instead of letting it finish unobserved
+    try:
+        killer = pymysql.connect(**active["config"], connect_timeout=5)
+        try:
+            cursor = killer.cursor()
+            cursor.execute("KILL QUERY %s", (conn.thread_id(),))
+            cursor.close()
+        finally:
+            killer.close()
+    except pymysql.Error as e:
+        logger.warning("Failed to kill read query on %s: %s", active["config"]["host"], e)
+
+def run_read_query(query, params, error_message):
+    active = {}
+    future = get_read_executor().submit(execute_read_query, get_read_db_configs(), query, params, active)
+    status = st.empty()
+    submitted = monotonic()
+    try:
+        while True:
+            try:
+                return future.result(timeout=READ_POLL_INTERVAL)
+            except FutureTimeoutError:
+                # The timeout covers execution only; time queued behind other reads gets its own allowance
+                started = active.get("started")
+                if started is None and monotonic() - submitted >= READ_QUERY_TIMEOUT:
+                    st.warning("All database readers are busy. Please try again shortly.")
+                    return []
+                if started is not None and monotonic() - started >= READ_QUERY_TIMEOUT:
+                    st.warning(f"Query timed out after {READ_QUERY_TIMEOUT:g} seconds. Try narrowing the search.")
+                    return []
+                # Any st call lets Streamlit stop this run when the user changes the query
+                status.caption("Searching...")
+    except pymysql.Error as e:
+        st.error(f"{error_message}: {e}")
+        return []
+    finally:
+        if not future.done():
+            cancel_read_query(future, active)
+        status.empty()
+
+def monthly_partition_bounds(first_day=None):
+    # (partition name, exclusive upper bound) from first_day's month (default: this month)
+    # through PARTITION_MONTHS_AHEAD months from now
+    month = (first_day or date.today()).replace(day=1)
+    last_month = date.today().replace(day=1)
+    for _ in range(PARTITION_MONTHS_AHEAD):
+        last_month = (last_month + timedelta(days=32)).replace(day=1)
+    bounds = []
+    while month <= last_month:
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        bounds.append((f"p{month:%Y%m}", next_month.isoformat()))
+        month = next_month
+    return bounds
+
+def monthly_partition_clause(first_day=None):
+    partitions = [
+        f"PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{bound}'))"
+        for name, bound in monthly_partition_bounds(first_day)
+    ]
+    partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (UNIX_TIMESTAMP(upload_time)) (" + ", ".join(partitions) + ")"
+
+def get_partition_names(cursor, table):
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+def get_column_names(cursor, table):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    return {row[0] for row in cursor.fetchall()}
+
+def get_index_columns(cursor, table, index_name):
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        ORDER BY SEQ_IN_INDEX
+    """, (table, index_name))
+    return [row[0] for row in cursor.fetchall()]
+
+def partition_table_by_month(cursor, table):
+    # Converts tables created before partitioning; MySQL requires upload_time in the primary key.
+    # Each step checks the schema first, so a conversion interrupted part-way resumes on the next run.
+    if "body_archived" not in get_column_names(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN body_archived TINYINT(1) NOT NULL DEFAULT 0")
+    if get_index_columns(cursor, table, "PRIMARY") != ["id", "upload_time"]:
+        cursor.execute(f"""
+            ALTER TABLE {table}
+                MODIFY upload_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (id, upload_time)
+        """)
+    if not get_index_columns(cursor, table, f"idx_{table}_user_time"):
+        cursor.execute(f"ALTER TABLE {table} ADD KEY idx_{table}_user_time (user_id, upload_time)")
+    if not get_partition_names(cursor, table):
+        # One partition per month of existing history, so old data is pruned too
+        cursor.execute(f"SELECT MIN(upload_time) FROM {table}")
+        oldest = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {table} {monthly_partition_clause(oldest.date() if oldest else None)}")
+
+def ensure_monthly_partitions(cursor, table):
+    existing = get_partition_names(cursor, table)
+    for name, bound in monthly_partition_bounds():
+        if name in existing:
+            continue
+        # Split the catch-all partition so the new month gets its own range
+        cursor.execute(f"""
+            ALTER TABLE {table} REORGANIZE PARTITION p_future INTO (
+                PARTITION {name} VALUES LESS THAN (UNIX_TIMESTAMP('{bound}')),
+                PARTITION p_future VALUES LESS THAN MAXVALUE
+            )
+        """)
+
 def create_documents_table():
     conn = get_db_connection()
     if conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS documents (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id INT AUTO_INCREMENT,
                 filename VARCHAR(255) NOT NULL,
                 extracted_text TEXT,
                 extracted_tables TEXT,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                user_id VARCHAR(50) NOT NULL
-            )
+                upload_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                user_id VARCHAR(50) NOT NULL,
+                body_archived TINYINT(1) NOT NULL DEFAULT 0,
+                PRIMARY KEY (id, upload_time),
+                KEY idx_documents_user_time (user_id, upload_time)
+            ) {monthly_partition_clause()}
         """)
         conn.commit()
         cursor.close()
@@ -51,19 +282,304 @@ def create_file_content_table():
     conn = get_db_connection()
     if conn:
         cursor = conn.cursor()
-        cursor.execute("""
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS file_content (
-                id INT AUTO_INCREMENT PRIMARY KEY,
+                id INT AUTO_INCREMENT,
                 filename VARCHAR(255) NOT NULL,
                 extracted_text TEXT COLLATE utf8mb4_unicode_ci,
                 user_id VARCHAR(50) NOT NULL,
-                upload_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                upload_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                body_archived TINYINT(1) NOT NULL DEFAULT 0,
+                PRIMARY KEY (id, upload_time),
+                KEY idx_file_content_user_time (user_id, upload_time)
+            ) {monthly_partition_clause()}
+        """)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+def create_archived_bodies_table():
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archived_bodies (
+                source_table VARCHAR(32) NOT NULL,
+                source_id INT NOT NULL,
+                codec VARCHAR(8) NOT NULL,
+                extracted_text LONGBLOB,
+                extracted_tables LONGBLOB,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (source_table, source_id)
             )
         """)
         conn.commit()
         cursor.close()
         conn.close()
 
+def compress_body(body):
+    if body is None:
+        return None
+    data = body.encode("utf-8")
+    if ARCHIVE_CODEC == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+def decompress_body(blob, codec):
+    if blob is None:
+        return ""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("The zstandard package is required to read this archived document.")
+        return zstandard.ZstdDecompressor().decompress(blob).decode("utf-8")
+    return gzip.decompress(blob).decode("utf-8")
+
+DECOMPRESS_ERRORS = (RuntimeError, OSError, EOFError, UnicodeDecodeError) + (
+    (zstandard.ZstdError,) if zstandard else ()
+)
+
+def archive_cold_bodies(conn):
+    # Archives batch after batch until nothing is left or ARCHIVE_PASS_SECONDS runs out.
+    # Returns (rows archived, whether rows may remain).
+    cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    deadline = monotonic() + ARCHIVE_PASS_SECONDS
+    archived = 0
+    cursor = conn.cursor()
+    try:
+        for table, columns in ARCHIVED_COLUMNS.items():
+            while True:
+                if monotonic() >= deadline:
+                    return archived, True
+                # The upload_time bound keeps the scan to the old partitions
+                cursor.execute(f"""
+                    SELECT id, {", ".join(columns)} FROM {table}
+                    WHERE upload_time < %s AND body_archived = 0
+                    LIMIT %s
+                """, (cutoff, ARCHIVE_BATCH_SIZE))
+                rows = cursor.fetchall()
+                archive_batch(cursor, table, columns, rows, cutoff)
+                conn.commit()
+                archived += len(rows)
+                if len(rows) < ARCHIVE_BATCH_SIZE:
+                    break
+        return archived, False
+    finally:
+        cursor.close()
+
+def archive_batch(cursor, table, columns, rows, cutoff):
+    for row in rows:
+        doc_id, bodies = row[0], [compress_body(body) for body in row[1:]]
+        bodies += [None] * (2 - len(bodies))
+        cursor.execute("""
+            INSERT INTO archived_bodies (source_table, source_id, codec, extracted_text, extracted_tables)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE codec = VALUES(codec),
+                extracted_text = VALUES(extracted_text), extracted_tables = VALUES(extracted_tables)
+        """, (table, doc_id, ARCHIVE_CODEC, *bodies))
+        cursor.execute(f"""
+            UPDATE {table} SET {", ".join(f"{column} = NULL" for column in columns)}, body_archived = 1
+            WHERE id = %s AND upload_time < %s
+        """, (doc_id, cutoff))
+
+def table_needs_migration(cursor, table):
+    return "body_archived" not in get_column_names(cursor, table) or not get_partition_names(cursor, table)
+
+def run_storage_maintenance(status):
+    # Runs on the maintenance thread, so it must not touch st.* calls
+    conn = pymysql.connect(**db_config)
+    cursor = conn.cursor()
+    try:
+        for table in ARCHIVED_COLUMNS:
+            partition_table_by_month(cursor, table)
+        status["migrated"] = True
+        for table in ARCHIVED_COLUMNS:
+            ensure_monthly_partitions(cursor, table)
+        archived, backlog = archive_cold_bodies(conn) if ARCHIVE_AFTER_DAYS > 0 else (0, False)
+    finally:
+        cursor.close()
+        conn.close()
+    status.update(ran_at=datetime.now(), archived=archived, backlog=backlog, error=None)
+
+def storage_maintenance_loop(status):
+    while True:
+        try:
+            run_storage_maintenance(status)
+        except pymysql.Error as e:
+            logger.warning("Storage maintenance failed: %s", e)
+            status.update(backlog=False, error=str(e))
+            sleep(STORAGE_MAINTENANCE_RETRY)
+            continue
+        # Drain an archival backlog pass after pass; otherwise wait a full interval
+        sleep(ARCHIVE_PASS_PAUSE if status["backlog"] else STORAGE_MAINTENANCE_INTERVAL)
+
+@st.cache_resource
+def start_storage_maintenance():
+    # One maintenance thread per server process, so migration and archival never run inside a script run
+    status = {"migrated": False, "ran_at": None, "archived": 0, "backlog": False, "error": None}
+    try:
+        conn = pymysql.connect(**db_config)
+        try:
+            cursor = conn.cursor()
+            status["migrated"] = not any(table_needs_migration(cursor, table) for table in ARCHIVED_COLUMNS)
+            cursor.close()
+        finally:
+            conn.close()
+    except pymysql.Error as e:
+        logger.warning("Failed to check storage migration: %s", e)
+    threading.Thread(
+        target=storage_maintenance_loop, args=(status,), name="storage-maintenance", daemon=True
+    ).start()
+    return status
+
+def search_archived_documents(query, params, terms):
+    # Content filters cannot see archived rows, so decompress the candidates that pass the other filters
+    candidates = run_read_query(
+        query + " AND d.body_archived = 1 ORDER BY d.upload_time DESC LIMIT %s",
+        [*params, ARCHIVE_SEARCH_LIMIT + 1],
+        "Failed to search archived documents"
+    )
+    if len(candidates) > ARCHIVE_SEARCH_LIMIT:
+        candidates = candidates[:ARCHIVE_SEARCH_LIMIT]
+        st.warning(
+            f"More than {ARCHIVE_SEARCH_LIMIT} archived documents match the other filters. Only the newest "
+            f"{ARCHIVE_SEARCH_LIMIT} were searched for text; older archived documents are left out of the "
+            "results. Narrow the date range to search them."
+        )
+    if not candidates:
+        return []
+    ids = [doc[4] for doc in candidates]
+    bodies = run_read_query(f"""
+        SELECT source_id, codec, extracted_text FROM archived_bodies
+        WHERE source_table = 'documents' AND source_id IN ({", ".join(["%s"] * len(ids))})
+    """, ids, "Failed to load archived documents")
+    terms = [term.lower() for term in terms]
+    matched = set()
+    for source_id, codec, blob in bodies:
+        try:
+            text = decompress_body(blob, codec).lower()
+        except DECOMPRESS_ERRORS as e:
+            logger.warning("Failed to decompress archived document %s: %s", source_id, e)
+            continue
+        if all(term in text for term in terms):
+            matched.add(source_id)
+    return [doc for doc in candidates if doc[4] in matched]
+
+def load_archived_body(source_table, source_id):
+    rows = run_read_query("""
+        SELECT codec, extracted_text, extracted_tables FROM archived_bodies
+        WHERE source_table = %s AND source_id = %s
+    """, (source_table, source_id), "Failed to load archived document")
+    if not rows:
+        return "", ""
+    codec, text, tables = rows[0]
+    # Only decompression is guarded; Streamlit's rerun/stop exceptions from the query must propagate
+    try:
+        return decompress_body(text, codec), decompress_body(tables, codec)
+    except DECOMPRESS_ERRORS as e:
+        st.error(f"Failed to decompress archived document: {e}")
+        return "", ""
+
+def load_document_body(doc_id, upload_time, archived):
+    if archived:
+        return load_archived_body("documents", doc_id)
+    # upload_time pins the lookup to a single partition
+    rows = run_read_query("""
+        SELECT extracted_text, extracted_tables FROM documents
+        WHERE id = %s AND upload_time = %s
+    """, (doc_id, upload_time), "Failed to load document")
+    if not rows:
+        return "", ""
+    return rows[0]
+
+def fetch_documents_by_ids(doc_ids):
+    # Rebuilds one page of search results from the stored id handle, in search order
+    if not doc_ids:
+        return []
+    rows = run_read_query(f"""
+        SELECT d.filename, d.user_id, d.upload_time, l.name, d.id, d.body_archived
+        FROM documents d
+        LEFT JOIN log_details l ON d.user_id = l.username
+        WHERE d.user_id = %s AND d.id IN ({", ".join(["%s"] * len(doc_ids))})
+    """, [st.session_state.admin_id, *doc_ids], "Failed to load search results")
+    rows_by_id = {row[4]: row for row in rows}
+    return [rows_by_id[doc_id] for doc_id in doc_ids if doc_id in rows_by_id]
+
+def estimate_size(value, seen=None):
+    # Deep sys.getsizeof; BytesIO-backed uploads report their buffer size
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in value)
+    return size
+
+def session_state_sizes():
+    return {key: estimate_size(st.session_state[key]) for key in list(st.session_state.keys())}
+
+@st.cache_resource
+def get_session_memory_registry():
+    # Shared across sessions: session_token -> (admin_id, total bytes, last updated, over budget)
+    return {}
+
+def check_session_memory_budget():
+    budget = SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+    sizes = session_state_sizes()
+    total = sum(sizes.values())
+    evictable = sorted(
+        (key for key in sizes if key.startswith(EVICTABLE_SESSION_PREFIXES)),
+        key=lambda key: sizes[key], reverse=True
+    )
+    for key in evictable:
+        if total <= budget:
+            break
+        total -= sizes[key]
+        del st.session_state[key]
+
+    # Files in the uploader are not stored yet, so they are never evicted; the admin is told instead
+    over_budget = total > budget
+    if over_budget:
+        pending_uploads = sizes.get(f"admin_uploader_{st.session_state.uploader_generation}", 0)
+        st.warning(
+            f"This session is using {total / 1024 / 1024:.1f} MB, over the {SESSION_MEMORY_BUDGET_MB:g} MB "
+            f"budget ({pending_uploads / 1024 / 1024:.1f} MB in files waiting to be uploaded). "
+            "Confirm or remove uploaded files to free memory."
+        )
+
+    registry = get_session_memory_registry()
+    now = datetime.now()
+    registry[st.session_state.session_token] = (st.session_state.get("admin_id"), total, now, over_budget)
+    for token, (_, _, updated, _) in list(registry.items()):
+        if now - updated > timedelta(seconds=SESSION_REGISTRY_TTL):
+            registry.pop(token, None)
+
+def session_memory_view():
+    with st.expander("Session Memory"):
+        st.write(f"**Budget per session:** {SESSION_MEMORY_BUDGET_MB:g} MB")
+        sizes = session_state_sizes()
+        st.write(f"**This session:** {sum(sizes.values()) / 1024:.1f} KB")
+        st.dataframe(pd.DataFrame([
+            {"Key": key, "Size (KB)": round(size / 1024, 1)}
+            for key, size in sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+        ]), use_container_width=True)
+        sessions = list(get_session_memory_registry().items())
+        # Other admins' sessions are only shown as totals
+        st.write(
+            f"**All sessions:** {len(sessions)} active, "
+            f"{sum(total for _, (_, total, _, _) in sessions) / 1024 / 1024:.1f} MB in total, "
+            f"{sum(1 for _, (_, _, _, over) in sessions if over)} over budget"
+        )
+        st.write("**Your sessions:**")
+        st.dataframe(pd.DataFrame([
+            {"Session": token, "Size (KB)": round(total / 1024, 1), "Over Budget": over, "Updated": updated}
+            for token, (admin_id, total, updated, over) in sessions
+            if admin_id == st.session_state.admin_id
+        ]), use_container_width=True)
+
 def create_log_details_table():
     conn = get_db_connection()
     if conn:
@@ -211,6 +727,9 @@ def store_document_content(filename, text, tables, user_id):
             """, (filename, normalized_text, user_id, datetime.now()))
             
             conn.commit()
+            st.session_state.last_write_time = datetime.now()
+            # New uploads may match the current search, so re-run it next time
+            st.session_state.pop("search_key", None)
             st.success(f"Content from {filename} stored successfully!")
             return True
         except pymysql.Error as e:
@@ -231,14 +750,25 @@ def admin_upload_page():
         st.rerun()
         return
 
-    uploaded_files = st.file_uploader("Choose PDF or DOCX files", type=["pdf", "docx"], accept_multiple_files=True)
+    uploaded_files = st.file_uploader(
+        "Choose PDF or DOCX files", type=["pdf", "docx"], accept_multiple_files=True,
+        key=f"admin_uploader_{st.session_state.uploader_generation}"
+    )
     
+    if "admin_confirmed_filenames" not in st.session_state:
+        st.session_state.admin_confirmed_filenames = {}
+    if "admin_stored_filenames" not in st.session_state:
+        st.session_state.admin_stored_filenames = set()
+    # Forget confirmations for files that are no longer in the uploader
+    current_names = {uploaded_file.name for uploaded_file in uploaded_files or []}
+    for original_filename in list(st.session_state.admin_confirmed_filenames):
+        if original_filename not in current_names:
+            del st.session_state.admin_confirmed_filenames[original_filename]
+    st.session_state.admin_stored_filenames &= current_names
+
     if uploaded_files:
         st.write("### Confirm Filenames")
         confirmed_files = []
-        
-        if "admin_confirmed_filenames" not in st.session_state:
-            st.session_state.admin_confirmed_filenames = {}
 
         for uploaded_file in uploaded_files:
             original_filename = uploaded_file.name
@@ -288,10 +818,18 @@ def admin_upload_page():
                 else:
                     st.info("No tables found in the document.")
 
-                store_document_content(filename, text, tables, st.session_state.admin_id)
+                stored = store_document_content(filename, text, tables, st.session_state.admin_id)
 
                 if uploaded_file.name in st.session_state.admin_confirmed_filenames:
                     del st.session_state.admin_confirmed_filenames[uploaded_file.name]
+                # A failed store keeps the file in the uploader so the admin can retry
+                if stored:
+                    st.session_state.admin_stored_filenames.add(uploaded_file.name)
+
+            # Once every file is on disk and in the database, drop the upload buffers on the next run
+            if st.session_state.admin_stored_filenames >= current_names:
+                st.session_state.admin_stored_filenames = set()
+                st.session_state.uploader_generation += 1
 
     if st.button("Back to Dashboard"):
         st.session_state.page = "admin_dashboard"
@@ -395,6 +933,13 @@ def admin_dashboard_page():
         st.rerun()
         return
 
+    maintenance = start_storage_maintenance()
+    if maintenance["error"]:
+        st.warning(f"Storage maintenance failed: {maintenance['error']}")
+    if not maintenance["migrated"]:
+        st.info("Document storage is being upgraded in the background. Please check back shortly.")
+        return
+
     col1, col2 = st.columns(2)
     with col1:
         if st.button("Upload Files"):
@@ -405,29 +950,23 @@ def admin_dashboard_page():
             st.session_state.show_search = True
 
     # Fetch documents uploaded by the currently logged-in admin
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        query = """
-            SELECT d.filename, d.user_id, d.upload_time, d.extracted_text, d.extracted_tables, l.name
-            FROM documents d
-            LEFT JOIN log_details l ON d.user_id = l.username
-            WHERE d.user_id = %s
-        """
-        cursor.execute(query, (st.session_state.admin_id,))
-        all_documents = cursor.fetchall()
-        cursor.close()
-        conn.close()
-    else:
-        st.error("Failed to connect to the database while fetching all documents.")
-        all_documents = []
+    query = """
+        SELECT d.filename, d.user_id, d.upload_time, l.name, d.id, d.body_archived
+        FROM documents d
+        LEFT JOIN log_details l ON d.user_id = l.username
+        WHERE d.user_id = %s
+    """
+    all_documents = run_read_query(
+        query, (st.session_state.admin_id,),
+        "Failed to fetch all documents"
+    )
 
     # Display table of documents using st.dataframe
     st.subheader("All Documents")
     if all_documents:
         table_data = []
         for doc in all_documents:
-            filename, user_id, upload_time, text, tables, username = doc
+            filename, user_id, upload_time, username, doc_id, archived = doc
             file_name, file_extension = os.path.splitext(filename)
             table_data.append({
                 "File Name": file_name,
@@ -458,77 +997,92 @@ def admin_dashboard_page():
             "Enter a Specific Word To Search In File Content",
             key="specific_word_search"
         )
-        documents = []
-        if search_query or specific_word:
+        specific_word = specific_word.strip()
+        # The stored id handle serves paging and detail views until the query changes
+        search_key = (search_query, specific_word)
+        has_handle = st.session_state.get("search_key") == search_key and "search_results" in st.session_state
+        if (search_query or specific_word) and not has_handle:
             params = parse_search_query(search_query)
             
-            conn = get_db_connection()
-            if conn:
-                cursor = conn.cursor()
-                query = """
-                    SELECT d.filename, d.user_id, d.upload_time, d.extracted_text, d.extracted_tables, l.name
-                    FROM documents d
-                    LEFT JOIN log_details l ON d.user_id = l.username
-                    WHERE d.user_id = %s
-                """
-                query_params = [st.session_state.admin_id]
-                
-                # Apply filters from parse_search_query
-                if params["username"]:
-                    query += " AND (l.name LIKE %s OR d.user_id LIKE %s)"
-                    query_params.extend([f"%{params['username']}%", f"%{params['username']}%"])
-                if params["user_id"]:
-                    query += " AND d.user_id LIKE %s"
-                    query_params.append(f"%{params['user_id']}%")
-                if params["start_date"]:
-                    query += " AND DATE(d.upload_time) >= %s"
-                    query_params.append(params["start_date"])
-                if params["end_date"]:
-                    query += " AND DATE(d.upload_time) <= %s"
-                    query_params.append(params["end_date"])
-                if params["start_time"]:
-                    query += " AND TIME(d.upload_time) >= %s"
-                    query_params.append(params["start_time"])
-                if params["end_time"]:
-                    query += " AND TIME(d.upload_time) <= %s"
-                    query_params.append(params["end_time"])
-                if params["filename"]:
-                    query += " AND LOWER(d.filename) = LOWER(%s)"
-                    query_params.append(params["filename"])
-                if params["text_query"]:
-                    query += " AND d.extracted_text LIKE %s"
-                    query_params.append(f"%{params['text_query']}%")
-                
-                # Add specific word search to the query
+            query = """
+                SELECT d.filename, d.user_id, d.upload_time, l.name, d.id, d.body_archived
+                FROM documents d
+                LEFT JOIN log_details l ON d.user_id = l.username
+                WHERE d.user_id = %s
+            """
+            query_params = [st.session_state.admin_id]
+            
+            # Apply filters from parse_search_query
+            if params["username"]:
+                query += " AND (l.name LIKE %s OR d.user_id LIKE %s)"
+                query_params.extend([f"%{params['username']}%", f"%{params['username']}%"])
+            if params["user_id"]:
+                query += " AND d.user_id LIKE %s"
+                query_params.append(f"%{params['user_id']}%")
+            # Compare upload_time directly (not DATE(...)) so MySQL can prune partitions
+            if params["start_date"]:
+                query += " AND d.upload_time >= %s"
+                query_params.append(datetime.combine(params["start_date"], time.min))
+            if params["end_date"]:
+                query += " AND d.upload_time < %s"
+                query_params.append(datetime.combine(params["end_date"] + timedelta(days=1), time.min))
+            if params["start_time"]:
+                query += " AND TIME(d.upload_time) >= %s"
+                query_params.append(params["start_time"])
+            if params["end_time"]:
+                query += " AND TIME(d.upload_time) <= %s"
+                query_params.append(params["end_time"])
+            if params["filename"]:
+                query += " AND LOWER(d.filename) = LOWER(%s)"
+                query_params.append(params["filename"])
+            # Non-content filters, reused for archived documents below
+            filter_query, filter_params = query, list(query_params)
+            content_terms = []
+            if params["text_query"]:
+                query += " AND d.extracted_text LIKE %s"
+                query_params.append(f"%{params['text_query']}%")
+                content_terms.append(params["text_query"])
+            
+            # Add specific word search to the query
+            if specific_word:
+                specific_word = specific_word.strip()
                 if specific_word:
-                    specific_word = specific_word.strip()
-                    if specific_word:
-                        query += " AND LOWER(d.extracted_text) LIKE LOWER(%s)"
-                        query_params.append(f"%{specific_word}%")
-
-                cursor.execute(query, query_params)
-                documents = cursor.fetchall()
-                cursor.close()
-                conn.close()
+                    query += " AND LOWER(d.extracted_text) LIKE LOWER(%s)"
+                    query_params.append(f"%{specific_word}%")
+                    content_terms.append(specific_word)
+
+            documents = run_read_query(query, query_params, "Failed to search documents")
+
+            if ARCHIVE_AFTER_DAYS > 0 and content_terms:
+                documents = list(documents) + search_archived_documents(filter_query, filter_params, content_terms)
+
+            # Keep only the matching ids between reruns, not the rows themselves. An empty result may be
+            # a timeout or error, so it is not kept as a handle and the next run searches again.
+            st.session_state.search_results = array("i", (doc[4] for doc in documents))
+            st.session_state.current_page = 0
+            if documents:
+                st.session_state.search_key = search_key
             else:
-                st.error("Failed to connect to the database while searching documents.")
+                st.session_state.pop("search_key", None)
+
+        result_ids = st.session_state.get("search_results", array("i")) if (search_query or specific_word) else array("i")
 
-        if documents:
+        if result_ids:
             if "current_page" not in st.session_state:
                 st.session_state.current_page = 0
             if "docs_per_page" not in st.session_state:
                 st.session_state.docs_per_page = 5
 
-            total_docs = len(documents)
+            total_docs = len(result_ids)
             total_pages = (total_docs + st.session_state.docs_per_page - 1) // st.session_state.docs_per_page
             
             start_idx = st.session_state.current_page * st.session_state.docs_per_page
             end_idx = min(start_idx + st.session_state.docs_per_page, total_docs)
-            current_docs = documents[start_idx:end_idx]
+            current_docs = fetch_documents_by_ids(result_ids[start_idx:end_idx])
 
             table_data = []
             for doc in current_docs:
-                filename, user_id, upload_time, text, tables, username = doc
+                filename, user_id, upload_time, username, doc_id, archived = doc
                 table_data.append({
                     "Filename": filename,
                     "Username": username if username else user_id,
@@ -540,8 +1094,6 @@ def admin_dashboard_page():
             df = pd.DataFrame(table_data)
             st.dataframe(df, use_container_width=True)
 
-            st.session_state["search_results"] = documents
-
             col1, col2, col3 = st.columns([1, 2, 1])
             with col1:
                 if st.session_state.current_page > 0:
@@ -559,8 +1111,10 @@ def admin_dashboard_page():
             st.subheader("Document Details")
             selected_filename = st.selectbox("Select a document to view details", [doc[0] for doc in current_docs])
             if selected_filename:
-                selected_doc = next(doc for doc in documents if doc[0] == selected_filename)
-                filename, user_id, upload_time, text, tables, username = selected_doc
+                selected_doc = next(doc for doc in current_docs if doc[0] == selected_filename)
+                filename, user_id, upload_time, username, doc_id, archived = selected_doc
+                # Bodies are fetched only for the document being viewed
+                text, tables = load_document_body(doc_id, upload_time, archived)
                 with st.expander(f"Details for: {filename}", expanded=True):
                     st.write(f"**Filename:** {filename}")
                     st.write(f"**User ID:** {user_id}")
@@ -627,6 +1181,8 @@ def admin_dashboard_page():
             st.session_state.page = "admin_dashboard"
             st.rerun()
 
+    session_memory_view()
+
 def login_page():
     st.title("Document Reader App")
     st.write("Log in or sign up to upload and manage documents.")
@@ -679,6 +1235,8 @@ def main():
     create_documents_table()
     create_file_content_table()
     create_admins_table()
+    create_archived_bodies_table()
+    start_storage_maintenance()
 
     if "page" not in st.session_state:
         st.session_state.page = "login"
@@ -688,10 +1246,12 @@ def main():
         st.session_state.user_details = {}
     if "admin_id" not in st.session_state:
         st.session_state.admin_id = None
-    if "search_results" not in st.session_state:
-        st.session_state.search_results = []
     if "admin_confirmed_filenames" not in st.session_state:
         st.session_state.admin_confirmed_filenames = {}
+    if "uploader_generation" not in st.session_state:
+        st.session_state.uploader_generation = 0
+    if "session_token" not in st.session_state:
+        st.session_state.session_token = uuid.uuid4().hex[:8]
 
     if st.session_state.page == "login":
         login_page()
@@ -706,5 +1266,7 @@ def main():
         admin_navigation_bar()
         admin_upload_page()
 
+    check_session_memory_budget()
+
 if __name__ == "__main__":
     main()